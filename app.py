@@ -6,20 +6,65 @@ For: Chris Hallberg Legal Case (SAML-00001)
 Date: October 14, 2025
 """
 
-from flask import Flask, render_template, jsonify, request, redirect, url_for, flash
+from flask import Flask, render_template, jsonify, request, redirect, url_for, flash, g, abort
+from flask.json.provider import JSONProvider
 from flask_login import LoginManager, login_user, logout_user, login_required, current_user
-from datetime import datetime
+from asgiref.wsgi import WsgiToAsgi
+from jinja2 import FileSystemBytecodeCache
+from sqlalchemy import text
+from sqlalchemy import exc as sa_exc
+from sqlalchemy.orm import selectinload
+from datetime import datetime, date
 from dotenv import load_dotenv
-import json
+from utils.file_handler import MAX_FILE_SIZE
+import functools
+import orjson
 import os
+import time
 
 # Load environment variables from .env file
 load_dotenv()
 
+class OrjsonProvider(JSONProvider):
+    """JSON provider backed by orjson so jsonify() uses the Rust
+    serializer and handles datetime/date values natively"""
+
+    def dumps(self, obj, **kwargs):
+        return orjson.dumps(obj).decode()
+
+    def loads(self, s, **kwargs):
+        return orjson.loads(s)
+
 app = Flask(__name__)
+app.json = OrjsonProvider(app)
+# Cache compiled templates on disk so worker restarts don't re-pay
+# Jinja compilation on the first hit of every page
+app.config['TEMPLATES_AUTO_RELOAD'] = False
+_JINJA_CACHE_DIR = '/tmp/jinja_cache'
+os.makedirs(_JINJA_CACHE_DIR, exist_ok=True)
+app.jinja_env.bytecode_cache = FileSystemBytecodeCache(directory=_JINJA_CACHE_DIR)
+app.jinja_env.auto_reload = False
 app.config['SECRET_KEY'] = os.getenv('SECRET_KEY', 'sam-law-fallback-key')
 app.config['SQLALCHEMY_DATABASE_URI'] = os.getenv('DATABASE_URL', 'sqlite:///sam_law.db')
 app.config['SQLALCHEMY_TRACK_MODIFICATIONS'] = False
+# Werkzeug aborts oversize request bodies in its own parser, before any
+# handler (or disk write) sees them
+app.config['MAX_CONTENT_LENGTH'] = MAX_FILE_SIZE
+# Pool tuning: pre-ping drops stale connections before they error out,
+# and a larger pool keeps >5 concurrent requests from serializing
+app.config['SQLALCHEMY_ENGINE_OPTIONS'] = {
+    'pool_pre_ping': True,
+    'pool_size': 20,
+    'max_overflow': 10,
+    'pool_recycle': 1800,
+    # Collapse executemany batches (seeding, bulk imports) into
+    # multi-row INSERT ... VALUES statements
+    'insertmanyvalues_page_size': 1000,
+}
+if app.config['SQLALCHEMY_DATABASE_URI'].startswith('postgres'):
+    # psycopg2 fast-execution mode batches the remaining executemany
+    # calls that insertmanyvalues doesn't cover
+    app.config['SQLALCHEMY_ENGINE_OPTIONS']['executemany_mode'] = 'values_plus_batch'
 
 # Initialize database
 from models import db, User, Case, Document, TimelineEvent, Note
@@ -31,10 +76,33 @@ login_manager.init_app(app)
 login_manager.login_view = 'login'
 login_manager.login_message = 'Please log in to access this page.'
 
+# In-process user cache - load_user runs on every authenticated request,
+# so skip the User.query.get round-trip for recently seen users
+_USER_CACHE_TTL = 60  # seconds
+_user_cache = {}
+
 @login_manager.user_loader
 def load_user(user_id):
-    """Load user for Flask-Login"""
-    return User.query.get(int(user_id))
+    """Load user for Flask-Login, caching the row briefly by id
+
+    Cached instances belong to an earlier request's session, so they are
+    re-attached to the current one with merge(load=False) - returning
+    them as-is would raise DetachedInstanceError on the first attribute
+    access after a request that committed.
+    """
+    uid = int(user_id)
+    cached = _user_cache.get(uid)
+    if cached and cached[1] > time.monotonic():
+        try:
+            return db.session.merge(cached[0], load=False)
+        except sa_exc.InvalidRequestError:
+            # Cached instance carries expired attributes (its own request
+            # committed after the load) - fall through to a fresh query
+            _user_cache.pop(uid, None)
+    user = db.session.get(User, uid)
+    if user:
+        _user_cache[uid] = (user, time.monotonic() + _USER_CACHE_TTL)
+    return user
 
 # Data directory
 DATA_DIR = os.path.join(os.path.dirname(__file__), 'data')
@@ -46,8 +114,30 @@ DOCUMENTS_FILE = os.path.join(DATA_DIR, 'documents.json')
 TIMELINE_FILE = os.path.join(DATA_DIR, 'timeline.json')
 NOTES_FILE = os.path.join(DATA_DIR, 'notes.json')
 
+# orjson helpers - Rust-based parser/serializer, handles datetime natively
+_loads = orjson.loads
+
+def _dumps(obj):
+    """Serialize with 2-space indent for readable data files"""
+    return orjson.dumps(obj, option=orjson.OPT_INDENT_2)
+
+# In-process cache for CASE_FILE - the file rarely changes, so routes
+# only pay for a stat() per request instead of an open + parse
+_case_cache = {"mtime": 0, "data": None}
+
+def get_case_data():
+    """Return parsed CASE_FILE contents, reloading only when the file changes"""
+    init_data()
+    mtime = os.stat(CASE_FILE).st_mtime
+    if _case_cache["data"] is None or mtime != _case_cache["mtime"]:
+        with open(CASE_FILE, 'r') as f:
+            _case_cache["data"] = _loads(f.read())
+        _case_cache["mtime"] = mtime
+    return _case_cache["data"]
+
+@functools.lru_cache(maxsize=1)
 def init_data():
-    """Initialize data files with default data"""
+    """Initialize data files with default data (runs once, on first use)"""
     if not os.path.exists(CASE_FILE):
         case_data = {
             "case_name": "Hallberg Separation",
@@ -55,15 +145,15 @@ def init_data():
             "client_name": "Chris Hallberg",
             "case_type": "Family Law - Separation",
             "status": "Preparing for Legal Aid",
-            "last_updated": datetime.now().isoformat()
+            "last_updated": datetime.now()  # orjson serializes datetime natively
         }
-        with open(CASE_FILE, 'w') as f:
-            json.dump(case_data, f, indent=2)
-    
+        with open(CASE_FILE, 'wb') as f:
+            f.write(_dumps(case_data))
+
     if not os.path.exists(DOCUMENTS_FILE):
         documents = []
-        with open(DOCUMENTS_FILE, 'w') as f:
-            json.dump(documents, f, indent=2)
+        with open(DOCUMENTS_FILE, 'wb') as f:
+            f.write(_dumps(documents))
     
     if not os.path.exists(TIMELINE_FILE):
         timeline = [
@@ -84,8 +174,8 @@ def init_data():
                 "status": "completed"
             }
         ]
-        with open(TIMELINE_FILE, 'w') as f:
-            json.dump(timeline, f, indent=2)
+        with open(TIMELINE_FILE, 'wb') as f:
+            f.write(_dumps(timeline))
     
     if not os.path.exists(NOTES_FILE):
         notes = [
@@ -93,14 +183,12 @@ def init_data():
                 "id": "note-001",
                 "title": "Questions for Lawyer",
                 "content": "1. Custody arrangements for Joshua\n2. Asset division process\n3. Timeline expectations",
-                "created": datetime.now().isoformat(),
+                "created": datetime.now(),
                 "category": "preparation"
             }
         ]
-        with open(NOTES_FILE, 'w') as f:
-            json.dump(notes, f, indent=2)
-
-init_data()
+        with open(NOTES_FILE, 'wb') as f:
+            f.write(_dumps(notes))
 
 # Routes
 # =============================================================================
@@ -112,19 +200,18 @@ def health():
     """Health check endpoint for Render monitoring"""
     try:
         # Check database connection
-        with app.app_context():
-            User.query.first()
-        
+        db.session.execute(text("SELECT 1"))
+
         return jsonify({
             "status": "healthy",
             "database": "connected",
-            "timestamp": datetime.now().isoformat()
+            "timestamp": datetime.now()
         }), 200
     except Exception as e:
         return jsonify({
             "status": "unhealthy",
             "error": str(e),
-            "timestamp": datetime.now().isoformat()
+            "timestamp": datetime.now()
         }), 500
 
 # =============================================================================
@@ -157,6 +244,7 @@ def login():
 @login_required
 def logout():
     """User logout"""
+    _user_cache.pop(current_user.id, None)
     logout_user()
     flash('You have been logged out successfully', 'success')
     return redirect(url_for('login'))
@@ -165,12 +253,25 @@ def logout():
 # APPLICATION ROUTES
 # =============================================================================
 
+def current_case(*options):
+    """Return the logged-in user's case, cached on g for the request
+
+    Loader options (e.g. selectinload) only apply on the first call of
+    the request, when the query actually runs.
+    """
+    if not hasattr(g, '_case'):
+        query = Case.query
+        if options:
+            query = query.options(*options)
+        g._case = query.filter_by(client_id=current_user.id).first()
+    return g._case
+
 @app.route('/')
 @login_required
 def dashboard():
     """Main dashboard - case overview"""
     # Get current user's case
-    case = Case.query.filter_by(client_id=current_user.id).first()
+    case = current_case()
     
     if not case:
         flash('No case found for your account. Please contact support.', 'error')
@@ -181,68 +282,72 @@ def dashboard():
                              timeline_count=0,
                              notes_count=0)
     
-    # Get related data from database
-    documents = Document.query.filter_by(case_id=case.id).all()
-    timeline = TimelineEvent.query.filter_by(case_id=case.id).order_by(TimelineEvent.event_date.desc()).all()
-    notes = Note.query.filter_by(case_id=case.id).order_by(Note.created_at.desc()).all()
-    
+    # Counter caches on Case (maintained in models.py) - the whole
+    # dashboard is served from the single Case row already loaded
     return render_template('dashboard.html',
                          case=case,
                          case_info=case,
-                         document_count=len(documents),
-                         timeline_count=len([e for e in timeline if e.status == 'upcoming']),
-                         notes_count=len(notes))
+                         document_count=case.document_count,
+                         timeline_count=case.open_timeline_count,
+                         notes_count=case.notes_count)
 
 @app.route('/documents')
 @login_required
 def documents():
     """Document management page"""
-    case = Case.query.filter_by(client_id=current_user.id).first()
+    case = current_case(selectinload(Case.documents))
     if not case:
         flash('No case found', 'error')
         return redirect(url_for('dashboard'))
-    
-    docs = Document.query.filter_by(case_id=case.id).order_by(Document.uploaded_at.desc()).all()
-    return render_template('documents.html', documents=docs)
+
+    return render_template('documents.html', documents=case.documents)
 
 @app.route('/timeline')
 @login_required
 def timeline():
     """Timeline and important dates"""
-    case = Case.query.filter_by(client_id=current_user.id).first()
+    case = current_case(selectinload(Case.timeline_events))
     if not case:
         flash('No case found', 'error')
         return redirect(url_for('dashboard'))
-    
-    events = TimelineEvent.query.filter_by(case_id=case.id).order_by(TimelineEvent.event_date).all()
-    return render_template('timeline.html', events=events)
+
+    return render_template('timeline.html', events=case.timeline_events)
 
 @app.route('/notes')
 @login_required
 def notes():
     """Notes and preparation"""
-    case = Case.query.filter_by(client_id=current_user.id).first()
+    case = current_case(selectinload(Case.notes))
     if not case:
         flash('No case found', 'error')
         return redirect(url_for('dashboard'))
-    
-    all_notes = Note.query.filter_by(case_id=case.id).order_by(Note.created_at.desc()).all()
-    return render_template('notes.html', notes=all_notes)
+
+    return render_template('notes.html', notes=case.notes)
 
 @app.route('/settings')
 @login_required
 def settings():
     """Settings and preferences"""
-    case = Case.query.filter_by(client_id=current_user.id).first()
+    case = current_case()
     return render_template('settings.html', case=case, user=current_user)
 
 # API Endpoints
+def body():
+    """Parse the request body with orjson, skipping Werkzeug's body cache
+
+    Malformed or empty bodies abort with 400, same as request.get_json()
+    """
+    try:
+        return orjson.loads(request.get_data(cache=False))
+    except orjson.JSONDecodeError:
+        abort(400, description='Invalid JSON body')
+
 @app.route('/api/documents/upload', methods=['POST'])
 @login_required
 def upload_document():
     """Upload a new document"""
-    data = request.get_json()
-    case = Case.query.filter_by(client_id=current_user.id).first()
+    data = body()
+    case = current_case()
     
     if not case:
         return jsonify({"success": False, "error": "No case found"}), 404
@@ -264,7 +369,7 @@ def upload_document():
             "id": new_doc.id,
             "name": new_doc.filename,
             "type": new_doc.document_type,
-            "uploaded": new_doc.uploaded_at.isoformat()
+            "uploaded": new_doc.uploaded_at
         }
     })
 
@@ -272,17 +377,16 @@ def upload_document():
 @login_required
 def add_timeline_event():
     """Add a new timeline event"""
-    data = request.get_json()
-    case = Case.query.filter_by(client_id=current_user.id).first()
+    data = body()
+    case = current_case()
     
     if not case:
         return jsonify({"success": False, "error": "No case found"}), 404
     
-    from datetime import datetime as dt
     new_event = TimelineEvent(
         case_id=case.id,
         title=data.get('title'),
-        event_date=dt.strptime(data.get('date'), '%Y-%m-%d').date(),
+        event_date=date.fromisoformat(data['date']),
         event_type=data.get('type', 'milestone'),
         description=data.get('description', ''),
         status='upcoming',
@@ -297,7 +401,7 @@ def add_timeline_event():
         "event": {
             "id": new_event.id,
             "title": new_event.title,
-            "date": new_event.event_date.isoformat(),
+            "date": new_event.event_date,
             "status": new_event.status
         }
     })
@@ -306,8 +410,8 @@ def add_timeline_event():
 @login_required
 def create_note():
     """Create a new note"""
-    data = request.get_json()
-    case = Case.query.filter_by(client_id=current_user.id).first()
+    data = body()
+    case = current_case()
     
     if not case:
         return jsonify({"success": False, "error": "No case found"}), 404
@@ -328,7 +432,7 @@ def create_note():
         "note": {
             "id": new_note.id,
             "title": new_note.title,
-            "created": new_note.created_at.isoformat(),
+            "created": new_note.created_at,
             "category": new_note.category
         }
     })
@@ -340,29 +444,25 @@ def create_note():
 @app.route('/files')
 def files():
     """Quick Files - Universal file server"""
-    with open(CASE_FILE, 'r') as f:
-        case_data = json.load(f)
+    case_data = get_case_data()
     return render_template('files.html', case_info=case_data)
 
 @app.route('/email')
 def email():
     """Email Inbox"""
-    with open(CASE_FILE, 'r') as f:
-        case_data = json.load(f)
+    case_data = get_case_data()
     return render_template('email.html', case_info=case_data)
 
 @app.route('/notifications')
 def notifications():
     """Notifications Center"""
-    with open(CASE_FILE, 'r') as f:
-        case_data = json.load(f)
+    case_data = get_case_data()
     return render_template('notifications.html', case_info=case_data)
 
 @app.route('/direct-messages')
 def direct_messages():
     """Direct Messages"""
-    with open(CASE_FILE, 'r') as f:
-        case_data = json.load(f)
+    case_data = get_case_data()
     return render_template('direct_messages.html', case_info=case_data)
 
 @app.route('/messages')
@@ -397,15 +497,13 @@ def my_lawyers():
 @app.route('/case-studies')
 def case_studies():
     """Case Studies"""
-    with open(CASE_FILE, 'r') as f:
-        case_data = json.load(f)
+    case_data = get_case_data()
     return render_template('case_studies.html', case_info=case_data)
 
 @app.route('/billing')
 def billing():
     """Billing (all cases)"""
-    with open(CASE_FILE, 'r') as f:
-        case_data = json.load(f)
+    case_data = get_case_data()
     return render_template('billing.html', case_info=case_data)
 
 @app.route('/legal-strategy')
@@ -413,36 +511,31 @@ def billing():
 @login_required
 def legal_strategy():
     """Legal Strategy (case-specific)"""
-    with open(CASE_FILE, 'r') as f:
-        case_data = json.load(f)
+    case_data = get_case_data()
     return render_template('legal_strategy.html', case_info=case_data)
 
 @app.route('/case-billing')
 def case_billing():
     """Case Billing (case-specific)"""
-    with open(CASE_FILE, 'r') as f:
-        case_data = json.load(f)
+    case_data = get_case_data()
     return render_template('case_billing.html', case_info=case_data)
 
 @app.route('/case-details')
 def case_details():
     """Case Details"""
-    with open(CASE_FILE, 'r') as f:
-        case_data = json.load(f)
+    case_data = get_case_data()
     return render_template('case_details.html', case_info=case_data)
 
 @app.route('/communications')
 def communications():
     """Communications"""
-    with open(CASE_FILE, 'r') as f:
-        case_data = json.load(f)
+    case_data = get_case_data()
     return render_template('communications.html', case=case_data)
 
 @app.route('/conversations')
 def conversations():
     """AI Legal Counsel"""
-    with open(CASE_FILE, 'r') as f:
-        case_data = json.load(f)
+    case_data = get_case_data()
     return render_template('conversations.html', case_info=case_data)
 
 @app.route('/my-cases')
@@ -452,28 +545,33 @@ def my_cases():
     case = Case.query.first()
     
     # Calculate days active
-    from datetime import datetime
     days_active = (datetime.now() - case.created_at).days if case else 0
-    
-    # Get upcoming deadlines from timeline
-    upcoming_deadlines = TimelineEvent.query.filter(
-        TimelineEvent.event_type == 'deadline',
-        TimelineEvent.event_date >= datetime.now().date()
-    ).order_by(TimelineEvent.event_date.asc()).limit(3).all()
-    
-    # Format for template
-    deadline_list = []
-    for event in upcoming_deadlines:
-        days_until = (event.event_date - datetime.now().date()).days if event.event_date else 0
-        deadline_list.append({
-            'title': event.title,
-            'date': event.event_date.strftime('%Y-%m-%d') if event.event_date else 'TBD',
-            'days_until': days_until
-        })
-    
+
+    # Upcoming deadlines - select only the two columns the template
+    # needs rather than hydrating full TimelineEvent objects
+    today = datetime.now().date()
+    rows = db.session.execute(
+        db.select(TimelineEvent.title, TimelineEvent.event_date)
+        .where(TimelineEvent.event_type == 'deadline',
+               TimelineEvent.event_date >= today)
+        .order_by(TimelineEvent.event_date.asc())
+        .limit(3)
+    ).all()
+
+    deadline_list = [{
+        'title': title,
+        'date': event_date.strftime('%Y-%m-%d'),
+        'days_until': (event_date - today).days
+    } for title, event_date in rows]
+
     return render_template('my_cases.html', case_info=case, days_active=days_active, upcoming_deadlines=deadline_list)
 
+# ASGI wrapper - lets uvicorn serve the app so I/O-bound requests
+# (DB round-trips, file reads) don't block a sync worker
+asgi_app = WsgiToAsgi(app)
+
 if __name__ == '__main__':
+    import uvicorn
     print("=" * 60)
     print("SAM LAW - Legal Case Management")
     print("=" * 60)
@@ -481,5 +579,5 @@ if __name__ == '__main__':
     print(f"For Chris Hallberg - Case: SAML-00001")
     print("=" * 60)
     port = int(os.environ.get('PORT', 5601))
-    app.run(host='0.0.0.0', port=port, debug=False)
+    uvicorn.run("app:asgi_app", host="0.0.0.0", port=port)
 
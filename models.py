@@ -6,8 +6,11 @@ User authentication and case management models
 
 from flask_sqlalchemy import SQLAlchemy
 from flask_login import UserMixin
+from sqlalchemy import event
+from sqlalchemy.orm.attributes import get_history
 from datetime import datetime
 import bcrypt
+import orjson
 
 db = SQLAlchemy()
 
@@ -51,6 +54,18 @@ class User(UserMixin, db.Model):
         salt = bcrypt.gensalt()
         self.password_hash = bcrypt.hashpw(password.encode('utf-8'), salt).decode('utf-8')
     
+    def set_password_hash(self, password_hash):
+        """
+        Assign an already-computed bcrypt hash directly
+
+        Skips the deliberately slow KDF - intended for fixtures and
+        seed data where the hash is precomputed, not for live signups.
+
+        Args:
+            password_hash: Bcrypt hash string
+        """
+        self.password_hash = password_hash
+
     def check_password(self, password):
         """
         Verify password against stored hash
@@ -106,31 +121,50 @@ class Case(db.Model):
     # Case details
     description = db.Column(db.Text)
     jurisdiction = db.Column(db.String(255))
+
+    # Counter caches - maintained by the event listeners below so the
+    # dashboard reads the Case row instead of issuing COUNT queries
+    document_count = db.Column(db.Integer, nullable=False, default=0)
+    open_timeline_count = db.Column(db.Integer, nullable=False, default=0)
+    notes_count = db.Column(db.Integer, nullable=False, default=0)
     
-    # Relationships
-    documents = db.relationship('Document', backref='case', lazy=True, cascade='all, delete-orphan')
-    timeline_events = db.relationship('TimelineEvent', backref='case', lazy=True, cascade='all, delete-orphan')
-    notes = db.relationship('Note', backref='case', lazy=True, cascade='all, delete-orphan')
+    # Relationships - ordered to match the listing pages so eager loads
+    # come back pre-sorted
+    documents = db.relationship('Document', backref='case', lazy=True, cascade='all, delete-orphan',
+                                order_by='Document.uploaded_at.desc()')
+    timeline_events = db.relationship('TimelineEvent', backref='case', lazy=True, cascade='all, delete-orphan',
+                                      order_by='TimelineEvent.event_date')
+    notes = db.relationship('Note', backref='case', lazy=True, cascade='all, delete-orphan',
+                            order_by='Note.created_at.desc()')
     
     @property
     def jurisdiction_dict(self):
-        """Parse jurisdiction string into dict for template compatibility"""
-        import json
+        """Parse jurisdiction string into dict for template compatibility
+
+        Templates may access this several times per render, so the parsed
+        dict is memoized on the instance until the string changes.
+        """
+        cached = getattr(self, '_juris_cache', None)
+        if cached and cached[0] == self.jurisdiction:
+            return cached[1]
         if self.jurisdiction:
             try:
-                return json.loads(self.jurisdiction)
-            except:
+                parsed = orjson.loads(self.jurisdiction)
+            except orjson.JSONDecodeError:
                 # Fallback if jurisdiction is plain string
-                return {
+                parsed = {
                     'court': self.jurisdiction,
                     'city': 'Toronto',
                     'province': 'ON'
                 }
-        return {
-            'court': 'Ontario Superior Court',
-            'city': 'Toronto',
-            'province': 'ON'
-        }
+        else:
+            parsed = {
+                'court': 'Ontario Superior Court',
+                'city': 'Toronto',
+                'province': 'ON'
+            }
+        self._juris_cache = (self.jurisdiction, parsed)
+        return parsed
     
     @property
     def lawyer_dict(self):
@@ -167,7 +201,10 @@ class Document(db.Model):
         ocr_text: Extracted text
     """
     __tablename__ = 'documents'
-    
+    __table_args__ = (
+        db.Index('ix_documents_case_uploaded', 'case_id', 'uploaded_at'),
+    )
+
     id = db.Column(db.Integer, primary_key=True)
     case_id = db.Column(db.Integer, db.ForeignKey('cases.id'), nullable=False)
     
@@ -203,7 +240,18 @@ class TimelineEvent(db.Model):
         created_by: User ID who created
     """
     __tablename__ = 'timeline_events'
-    
+    __table_args__ = (
+        db.Index('ix_timeline_case_date', 'case_id', 'event_date'),
+        # Partial indexes - the dashboard counts upcoming events and
+        # my_cases scans future deadlines, both highly selective
+        db.Index('ix_timeline_upcoming', 'case_id', 'event_date',
+                 postgresql_where=db.text("status = 'upcoming'"),
+                 sqlite_where=db.text("status = 'upcoming'")),
+        db.Index('ix_timeline_deadlines', 'event_date',
+                 postgresql_where=db.text("event_type = 'deadline'"),
+                 sqlite_where=db.text("event_type = 'deadline'")),
+    )
+
     id = db.Column(db.Integer, primary_key=True)
     case_id = db.Column(db.Integer, db.ForeignKey('cases.id'), nullable=False)
     
@@ -235,7 +283,10 @@ class Note(db.Model):
         created_by: User ID who created
     """
     __tablename__ = 'notes'
-    
+    __table_args__ = (
+        db.Index('ix_notes_case_created', 'case_id', 'created_at'),
+    )
+
     id = db.Column(db.Integer, primary_key=True)
     case_id = db.Column(db.Integer, db.ForeignKey('cases.id'), nullable=False)
     
@@ -246,7 +297,69 @@ class Note(db.Model):
     created_at = db.Column(db.DateTime, nullable=False, default=datetime.utcnow)
     updated_at = db.Column(db.DateTime, nullable=False, default=datetime.utcnow, onupdate=datetime.utcnow)
     created_by = db.Column(db.Integer, db.ForeignKey('users.id'), nullable=False)
-    
+
     def __repr__(self):
         return f'<Note {self.title}>'
 
+
+# =============================================================================
+# Counter-cache maintenance
+# =============================================================================
+
+def _bump_case_counter(connection, case_id, column, delta):
+    """Apply a +/- delta to one of the Case counter columns"""
+    table = Case.__table__
+    connection.execute(
+        table.update()
+        .where(table.c.id == case_id)
+        .values({column: table.c[column] + delta})
+    )
+
+@event.listens_for(Document, 'after_insert')
+def _document_added(mapper, connection, target):
+    _bump_case_counter(connection, target.case_id, 'document_count', 1)
+
+@event.listens_for(Document, 'after_delete')
+def _document_removed(mapper, connection, target):
+    _bump_case_counter(connection, target.case_id, 'document_count', -1)
+
+@event.listens_for(Note, 'after_insert')
+def _note_added(mapper, connection, target):
+    _bump_case_counter(connection, target.case_id, 'notes_count', 1)
+
+@event.listens_for(Note, 'after_delete')
+def _note_removed(mapper, connection, target):
+    _bump_case_counter(connection, target.case_id, 'notes_count', -1)
+
+@event.listens_for(TimelineEvent, 'after_insert')
+def _event_added(mapper, connection, target):
+    if target.status == 'upcoming':
+        _bump_case_counter(connection, target.case_id, 'open_timeline_count', 1)
+
+@event.listens_for(TimelineEvent, 'after_delete')
+def _event_removed(mapper, connection, target):
+    if target.status == 'upcoming':
+        _bump_case_counter(connection, target.case_id, 'open_timeline_count', -1)
+
+@event.listens_for(TimelineEvent, 'before_update')
+def _event_status_changed(mapper, connection, target):
+    # before_update so the UPDATE hasn't hit the DB yet and the old
+    # status can still be recovered
+    history = get_history(target, 'status')
+    if not history.has_changes():
+        return
+    if history.deleted:
+        old_status = history.deleted[0]
+    else:
+        # Old value was expired by a prior commit - read it from the DB
+        table = TimelineEvent.__table__
+        old_status = connection.execute(
+            db.select(table.c.status).where(table.c.id == target.id)
+        ).scalar()
+    was_upcoming = old_status == 'upcoming'
+    is_upcoming = target.status == 'upcoming'
+    if was_upcoming and not is_upcoming:
+        _bump_case_counter(connection, target.case_id, 'open_timeline_count', -1)
+    elif is_upcoming and not was_upcoming:
+        _bump_case_counter(connection, target.case_id, 'open_timeline_count', 1)
+
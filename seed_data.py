@@ -6,16 +6,26 @@ Populates database with Chris Hallberg's case data
 
 from app import app
 from models import db, User, Case, Document, TimelineEvent, Note
+from sqlalchemy import insert
 from datetime import datetime, date
 
+# Precomputed bcrypt hashes for the fixed seed credentials - skips two
+# ~100ms KDF runs every time the seed is executed
+# chris@xibalba.io / secure123
+CHRIS_HASH = '$2b$12$5IFFvzmDOsiRM.TUiJagH.lmx09VgyCwUT.XGAIIxFtg4Nte8dr/a'
+# emma.rodriguez@samlaw.io / lawyer123
+EMMA_HASH = '$2b$12$ZjO3vfo7slpkeD2i9x6mlu1RdWl9GIgipHLCQwkEoe/9vAEGzlk0y'
+
 def seed_database():
     """Seed database with Chris Hallberg's case"""
-    with app.app_context():
+    # One explicit transaction for the whole seed - a single commit/fsync
+    # at block exit instead of incremental commits along the way
+    with app.app_context(), db.session.begin():
         print("=" * 60)
         print("SAM LAW - Seeding Database with Real Case Data")
         print("=" * 60)
         
-        # Create Chris Hallberg (client)
+        # Create both users up front - one flush populates both IDs
         print("\n1. Creating client user...")
         chris = User(
             email='chris@xibalba.io',
@@ -23,12 +33,8 @@ def seed_database():
             role='client',
             is_active=True
         )
-        chris.set_password('secure123')  # Will be changed to real auth
-        db.session.add(chris)
-        db.session.flush()  # Get chris.id
-        print(f"   ✅ Created client: {chris.full_name} (ID: {chris.id})")
-        
-        # Create Emma Rodriguez (lawyer)
+        chris.set_password_hash(CHRIS_HASH)  # Will be changed to real auth
+
         print("\n2. Creating lawyer user...")
         emma = User(
             email='emma.rodriguez@samlaw.io',
@@ -36,9 +42,11 @@ def seed_database():
             role='lawyer',
             is_active=True
         )
-        emma.set_password('lawyer123')
-        db.session.add(emma)
-        db.session.flush()  # Get emma.id
+        emma.set_password_hash(EMMA_HASH)
+
+        db.session.add_all([chris, emma])
+        db.session.flush()  # Get chris.id and emma.id in one round-trip
+        print(f"   ✅ Created client: {chris.full_name} (ID: {chris.id})")
         print(f"   ✅ Created lawyer: {emma.full_name} (ID: {emma.id})")
         
         # Create Chris's case
@@ -57,75 +65,76 @@ def seed_database():
         db.session.flush()  # Get case.id
         print(f"   ✅ Created case: {case.case_number} - {case.case_name}")
         
-        # Create timeline events
+        # Create timeline events - bulk-inserted as plain dicts so the
+        # whole batch goes in with one executemany instead of row-by-row
+        # unit-of-work INSERTs
         print("\n4. Creating timeline events...")
         events = [
-            TimelineEvent(
-                case_id=case.id,
-                title='Legal Aid Application Deadline',
-                event_date=date(2025, 10, 25),
-                event_type='deadline',
-                description='Deadline to submit Legal Aid application with all supporting documentation',
-                status='upcoming',
-                created_by=chris.id
-            ),
-            TimelineEvent(
-                case_id=case.id,
-                title='Separation Date',
-                event_date=date(2024, 6, 15),
-                event_type='milestone',
-                description='Official separation date - documented',
-                status='completed',
-                created_by=chris.id
-            ),
-            TimelineEvent(
-                case_id=case.id,
-                title='Initial Consultation with Emma',
-                event_date=date(2025, 10, 1),
-                event_type='meeting',
-                description='First meeting with lawyer to discuss case strategy',
-                status='completed',
-                created_by=emma.id
-            )
+            {
+                'case_id': case.id,
+                'title': 'Legal Aid Application Deadline',
+                'event_date': date(2025, 10, 25),
+                'event_type': 'deadline',
+                'description': 'Deadline to submit Legal Aid application with all supporting documentation',
+                'status': 'upcoming',
+                'created_by': chris.id
+            },
+            {
+                'case_id': case.id,
+                'title': 'Separation Date',
+                'event_date': date(2024, 6, 15),
+                'event_type': 'milestone',
+                'description': 'Official separation date - documented',
+                'status': 'completed',
+                'created_by': chris.id
+            },
+            {
+                'case_id': case.id,
+                'title': 'Initial Consultation with Emma',
+                'event_date': date(2025, 10, 1),
+                'event_type': 'meeting',
+                'description': 'First meeting with lawyer to discuss case strategy',
+                'status': 'completed',
+                'created_by': emma.id
+            }
         ]
-        for event in events:
-            db.session.add(event)
+        db.session.execute(insert(TimelineEvent), events)
         print(f"   ✅ Created {len(events)} timeline events")
-        
+
         # Create notes
         print("\n5. Creating case notes...")
         notes = [
-            Note(
-                case_id=case.id,
-                title='Questions for Lawyer',
-                content='1. Custody arrangements for Joshua\n2. Asset division process\n3. Timeline expectations\n4. Legal Aid application requirements',
-                category='preparation',
-                created_by=chris.id
-            ),
-            Note(
-                case_id=case.id,
-                title='Legal Aid Requirements',
-                content='Need to gather:\n- Proof of income (last 3 months)\n- Bank statements\n- Documentation of separation\n- List of assets and debts',
-                category='legal-aid',
-                created_by=chris.id
-            ),
-            Note(
-                case_id=case.id,
-                title='Case Strategy Notes',
-                content='Focus on:\n1. Documenting separation timeline\n2. Establishing custody arrangements\n3. Fair asset division\n4. Maintaining communication for Joshua',
-                category='strategy',
-                created_by=emma.id
-            )
+            {
+                'case_id': case.id,
+                'title': 'Questions for Lawyer',
+                'content': '1. Custody arrangements for Joshua\n2. Asset division process\n3. Timeline expectations\n4. Legal Aid application requirements',
+                'category': 'preparation',
+                'created_by': chris.id
+            },
+            {
+                'case_id': case.id,
+                'title': 'Legal Aid Requirements',
+                'content': 'Need to gather:\n- Proof of income (last 3 months)\n- Bank statements\n- Documentation of separation\n- List of assets and debts',
+                'category': 'legal-aid',
+                'created_by': chris.id
+            },
+            {
+                'case_id': case.id,
+                'title': 'Case Strategy Notes',
+                'content': 'Focus on:\n1. Documenting separation timeline\n2. Establishing custody arrangements\n3. Fair asset division\n4. Maintaining communication for Joshua',
+                'category': 'strategy',
+                'created_by': emma.id
+            }
         ]
-        for note in notes:
-            db.session.add(note)
+        db.session.execute(insert(Note), notes)
         print(f"   ✅ Created {len(notes)} case notes")
+
+        # Bulk inserts bypass the ORM event listeners that maintain the
+        # Case counter caches, so set them here to match the seed data
+        case.open_timeline_count = sum(1 for e in events if e['status'] == 'upcoming')
+        case.notes_count = len(notes)
         
-        # Commit all changes
-        print("\n6. Committing all data to database...")
-        db.session.commit()
-        print("   ✅ All data committed successfully")
-        
+        # Transaction commits once when the session.begin() block exits
         print("\n" + "=" * 60)
         print("Database seeding complete!")
         print("=" * 60)
@@ -6,10 +6,17 @@ Date: October 14, 2025, 3:42 PM
 Handles file uploads, validation, storage, and metadata tracking.
 """
 
+import functools
+import glob
 import os
+import queue
+import threading
+import time
 import uuid
 import hashlib
-import mimetypes
+import fastcdc
+import orjson
+import xxhash
 from datetime import datetime
 from werkzeug.utils import secure_filename
 
@@ -24,25 +31,140 @@ ALLOWED_EXTENSIONS = {
     'txt': 'text/plain'
 }
 
+# Precomputed views of ALLOWED_EXTENSIONS for the hot path
+_ALLOWED_SUFFIXES = tuple('.' + ext for ext in ALLOWED_EXTENSIONS)
+_ALLOWED_EXTS_DISPLAY = ", ".join(ALLOWED_EXTENSIONS)
+
 UPLOAD_FOLDER = os.path.join(os.path.dirname(os.path.dirname(__file__)), 'uploads')
 MAX_FILE_SIZE = 50 * 1024 * 1024  # 50MB
 
+# Content-addressed chunk store - FastCDC chunks shared across
+# documents, so near-identical files (revised contracts, appended
+# pages) dedup at the chunk level instead of whole-file only.
+# Each document's recipe (ordered chunk hash list) is persisted in
+# RECIPE_STORE; recipes double as the reference tracking that lets
+# delete_file garbage-collect chunks no other document uses.
+CHUNK_STORE = os.path.join(UPLOAD_FOLDER, 'chunks')
+RECIPE_STORE = os.path.join(UPLOAD_FOLDER, 'recipes')
+CDC_MIN_SIZE = 2048
+CDC_AVG_SIZE = 8192
+CDC_MAX_SIZE = 65536
+
+def _sha256():
+    """SHA-256 via hashlib.new with usedforsecurity=False, which routes
+    to the fastest available OpenSSL provider (SHA-NI where present)"""
+    return hashlib.new('sha256', usedforsecurity=False)
+
+@functools.lru_cache(maxsize=256)
+def _case_dir(case_id):
+    """Per-case upload directory, created once and then served from cache
+
+    Caching avoids re-joining the path and re-stating the directory via
+    makedirs on every upload for the same case.
+    """
+    d = os.path.join(UPLOAD_FOLDER, case_id)
+    os.makedirs(d, exist_ok=True)
+    return d
+
 def allowed_file(filename):
     """Check if file extension is allowed"""
-    return '.' in filename and filename.rsplit('.', 1)[1].lower() in ALLOWED_EXTENSIONS
+    # endswith with a tuple is a single C-level suffix scan, no
+    # intermediate split/list allocation
+    return filename.lower().endswith(_ALLOWED_SUFFIXES)
 
 def get_file_hash(file_path):
     """Generate SHA256 hash of file for deduplication"""
-    sha256_hash = hashlib.sha256()
     with open(file_path, "rb") as f:
-        for byte_block in iter(lambda: f.read(4096), b""):
+        if hasattr(hashlib, 'file_digest'):
+            # Python 3.11+: C-level read/update loop, releases the GIL
+            return hashlib.file_digest(f, _sha256).hexdigest()
+        sha256_hash = _sha256()
+        for byte_block in iter(lambda: f.read(1 << 20), b""):
             sha256_hash.update(byte_block)
-    return sha256_hash.hexdigest()
+        return sha256_hash.hexdigest()
+
+def get_weak_fingerprint(file_path):
+    """Generate xxh3-128 fingerprint of file
+
+    An order of magnitude faster than SHA-256, so it serves as the
+    primary dedup key; the SHA-256 is only needed to confirm a match
+    when two files share a weak fingerprint.
+    """
+    h = xxhash.xxh3_128()
+    with open(file_path, "rb") as f:
+        for byte_block in iter(lambda: f.read(1 << 20), b""):
+            h.update(byte_block)
+    return h.hexdigest()
 
 def get_file_size(file_path):
     """Get file size in bytes"""
     return os.path.getsize(file_path)
 
+def _recipe_path(document_id):
+    return os.path.join(RECIPE_STORE, f"{document_id}.json")
+
+def store_file_chunks(file_path, document_id):
+    """Chunk a stored file with FastCDC and persist unique chunks
+
+    Chunk boundaries are content-defined, so shared regions between
+    document versions map to the same chunk hashes regardless of
+    insertions earlier in the file. Unique chunks land in CHUNK_STORE
+    keyed by their SHA-256, and the recipe (ordered chunk hash list) is
+    written to RECIPE_STORE so the document's chunk references survive
+    the request and can be released on delete.
+
+    Args:
+        file_path: Path of the fully written upload
+        document_id: Document the recipe is stored under
+
+    Returns:
+        list: Chunk hashes in file order
+    """
+    os.makedirs(CHUNK_STORE, exist_ok=True)
+    os.makedirs(RECIPE_STORE, exist_ok=True)
+    recipe = []
+    # fastcdc mmaps the file and rejects empty ones - a 0-byte upload
+    # gets an empty recipe so delete-time reference tracking still sees
+    # a recipe file for every document
+    if os.path.getsize(file_path):
+        for chunk in fastcdc.fastcdc(file_path, min_size=CDC_MIN_SIZE,
+                                     avg_size=CDC_AVG_SIZE, max_size=CDC_MAX_SIZE,
+                                     fat=True, hf=hashlib.sha256):
+            recipe.append(chunk.hash)
+            chunk_path = os.path.join(CHUNK_STORE, chunk.hash)
+            if not os.path.exists(chunk_path):
+                with open(chunk_path, 'wb') as f:
+                    f.write(chunk.data)
+    with open(_recipe_path(document_id), 'wb') as f:
+        f.write(orjson.dumps(recipe))
+    return recipe
+
+def release_file_chunks(document_id):
+    """Drop a document's chunk recipe and collect unreferenced chunks
+
+    Reads the deleted document's recipe, removes it, then unlinks any of
+    its chunks that no surviving recipe still references - chunks shared
+    with other documents stay put.
+
+    Args:
+        document_id: Document whose chunks are being released
+    """
+    recipe_path = _recipe_path(document_id)
+    if not os.path.exists(recipe_path):
+        return
+    with open(recipe_path, 'rb') as f:
+        recipe = orjson.loads(f.read())
+    os.unlink(recipe_path)
+
+    still_referenced = set()
+    for path in glob.glob(os.path.join(glob.escape(RECIPE_STORE), '*.json')):
+        with open(path, 'rb') as f:
+            still_referenced.update(orjson.loads(f.read()))
+    for chunk_hash in set(recipe) - still_referenced:
+        chunk_path = os.path.join(CHUNK_STORE, chunk_hash)
+        if os.path.exists(chunk_path):
+            os.unlink(chunk_path)
+
 def save_uploaded_file(file, case_id='SAML-00001', uploaded_by='Chris Hallberg'):
     """
     Save uploaded file and return metadata
@@ -59,7 +181,13 @@ def save_uploaded_file(file, case_id='SAML-00001', uploaded_by='Chris Hallberg')
         return {'success': False, 'error': 'No file provided'}
     
     if not allowed_file(file.filename):
-        return {'success': False, 'error': f'File type not allowed. Allowed types: {", ".join(ALLOWED_EXTENSIONS.keys())}'}
+        return {'success': False, 'error': f'File type not allowed. Allowed types: {_ALLOWED_EXTS_DISPLAY}'}
+
+    # Reject on the declared Content-Length before writing anything;
+    # the streaming size check below still catches clients that lie
+    content_length = getattr(file, 'content_length', None) or 0
+    if content_length > MAX_FILE_SIZE:
+        return {'success': False, 'error': f'File too large. Maximum size: {MAX_FILE_SIZE / (1024*1024)}MB'}
     
     # Generate unique filename
     original_filename = secure_filename(file.filename)
@@ -67,29 +195,62 @@ def save_uploaded_file(file, case_id='SAML-00001', uploaded_by='Chris Hallberg')
     unique_id = str(uuid.uuid4())
     stored_filename = f"{unique_id}.{file_ext}"
     
-    # Create case-specific directory
-    case_upload_dir = os.path.join(UPLOAD_FOLDER, case_id)
-    os.makedirs(case_upload_dir, exist_ok=True)
-    
-    file_path = os.path.join(case_upload_dir, stored_filename)
-    
-    # Save file
+    file_path = os.path.join(_case_dir(case_id), stored_filename)
+
+    # Stream the upload once, writing, hashing, and counting bytes in a
+    # single pass - oversize uploads are cut off mid-stream instead of
+    # being fully written to disk and re-read for hashing. Hashing runs
+    # in a worker thread so it overlaps the disk writes; the C hash
+    # routines release the GIL on chunks this large.
+    hasher = _sha256()
+    weak_hasher = xxhash.xxh3_128()
+    chunk_queue = queue.Queue(maxsize=4)
+
+    def hash_worker():
+        while (chunk := chunk_queue.get()) is not None:
+            hasher.update(chunk)
+            weak_hasher.update(chunk)
+
+    worker = threading.Thread(target=hash_worker)
+    worker.start()
+
+    # Stream into a .part temp file and only rename to the final path
+    # once the full pass succeeds - readers (and the glob lookup in
+    # get_file_path) never see a partially written document
+    tmp_path = file_path + '.part'
+    file_size = 0
     try:
-        file.save(file_path)
+        with open(tmp_path, 'wb') as out:
+            while chunk := file.stream.read(1 << 20):
+                file_size += len(chunk)
+                if file_size > MAX_FILE_SIZE:
+                    break
+                chunk_queue.put(chunk)
+                out.write(chunk)
     except Exception as e:
+        if os.path.exists(tmp_path):
+            os.unlink(tmp_path)
         return {'success': False, 'error': f'Failed to save file: {str(e)}'}
-    
-    # Get file info
-    file_size = get_file_size(file_path)
-    file_hash = get_file_hash(file_path)
-    
-    # Check file size
+    finally:
+        chunk_queue.put(None)
+        worker.join()
+
     if file_size > MAX_FILE_SIZE:
-        os.remove(file_path)
+        os.unlink(tmp_path)
         return {'success': False, 'error': f'File too large. Maximum size: {MAX_FILE_SIZE / (1024*1024)}MB'}
+
+    os.replace(tmp_path, file_path)  # atomic on POSIX and Windows
+    file_hash = hasher.hexdigest()
+
+    # Chunk-level dedup: record the FastCDC recipe alongside the file.
+    # The materialized file stays as the serving path; the chunk store
+    # captures regions shared with other documents.
+    chunk_recipe = store_file_chunks(file_path, unique_id)
     
-    # Detect MIME type
-    mime_type = mimetypes.guess_type(original_filename)[0] or ALLOWED_EXTENSIONS.get(file_ext)
+    # Every allowed extension already has a canonical MIME type, so the
+    # mimetypes module (and its /etc/mime.types parse on first call) is
+    # unnecessary
+    mime_type = ALLOWED_EXTENSIONS.get(file_ext, 'application/octet-stream')
     
     # Build metadata
     metadata = {
@@ -99,13 +260,16 @@ def save_uploaded_file(file, case_id='SAML-00001', uploaded_by='Chris Hallberg')
         'stored_filename': stored_filename,
         'file_path': file_path,
         'file_size': file_size,
-        'file_size_mb': round(file_size / (1024*1024), 2),
         'file_hash': file_hash,
+        'file_hash_weak': weak_hasher.hexdigest(),  # xxh3 dedup key; SHA-256 confirms collisions
+        'chunks': chunk_recipe,
         'file_type': file_ext,
         'mime_type': mime_type,
         'case_id': case_id,
         'uploaded_by': uploaded_by,
-        'uploaded_at': datetime.now().isoformat(),
+        # Raw epoch nanoseconds - tz-safe, and the ISO string / MB
+        # rounding are presentation concerns computed at read time
+        'uploaded_at_ns': time.time_ns(),
         'ocr_status': 'pending',  # Will be processed later
         'tags': [],
         'version': 1
@@ -115,14 +279,14 @@ def save_uploaded_file(file, case_id='SAML-00001', uploaded_by='Chris Hallberg')
 
 def get_file_path(document_id, case_id='SAML-00001'):
     """Get file path from document ID"""
+    # Stored files are always "<document_id>.<ext>", so match directly
+    # instead of iterating the whole directory in Python. Plain join
+    # here - only the save path may create the case directory.
     case_upload_dir = os.path.join(UPLOAD_FOLDER, case_id)
-    
-    # Search for file with this document ID
-    if os.path.exists(case_upload_dir):
-        for filename in os.listdir(case_upload_dir):
-            if filename.startswith(document_id):
-                return os.path.join(case_upload_dir, filename)
-    
+    matches = glob.glob(os.path.join(glob.escape(case_upload_dir), f"{glob.escape(document_id)}.*"))
+    if matches:
+        return matches[0]
+
     return None
 
 def delete_file(document_id, case_id='SAML-00001'):
@@ -132,6 +296,7 @@ def delete_file(document_id, case_id='SAML-00001'):
     if file_path and os.path.exists(file_path):
         try:
             os.remove(file_path)
+            release_file_chunks(document_id)
             return {'success': True, 'message': 'File deleted'}
         except Exception as e:
             return {'success': False, 'error': f'Failed to delete file: {str(e)}'}
@@ -141,20 +306,22 @@ def delete_file(document_id, case_id='SAML-00001'):
 def list_uploaded_files(case_id='SAML-00001'):
     """List all files for a case"""
     case_upload_dir = os.path.join(UPLOAD_FOLDER, case_id)
-    
     if not os.path.exists(case_upload_dir):
         return []
-    
+
+    # scandir shares one cached stat per entry instead of separate
+    # isfile/getsize/getmtime syscalls per file
     files = []
-    for filename in os.listdir(case_upload_dir):
-        file_path = os.path.join(case_upload_dir, filename)
-        if os.path.isfile(file_path):
-            files.append({
-                'filename': filename,
-                'path': file_path,
-                'size': get_file_size(file_path),
-                'modified': datetime.fromtimestamp(os.path.getmtime(file_path)).isoformat()
-            })
-    
+    with os.scandir(case_upload_dir) as entries:
+        for entry in entries:
+            if entry.is_file(follow_symlinks=False):
+                stat = entry.stat()
+                files.append({
+                    'filename': entry.name,
+                    'path': entry.path,
+                    'size': stat.st_size,
+                    'modified': datetime.fromtimestamp(stat.st_mtime).isoformat()
+                })
+
     return files
 